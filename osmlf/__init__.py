@@ -1,3 +1,4 @@
 #!/usr/bin/env python3
 
-from .main import osmlf
\ No newline at end of file
+from .main import osmlf
+from .snapshots import snapshots, snapshot
\ No newline at end of file
@@ -18,17 +18,20 @@ from geopy.geocoders import Nominatim
 from .overpass_queries import queries
 from .overpass_operations import operations
 from .overpass_calculations import calculations
+from .snapshots import snapshots
 
 class osmlf:
 
     __version__ = '0.0.1'
 
-    def __init__(self, location):
+    def __init__(self, location, node_rows: bool = False):
         """
         Initializes an osmlf object with the specified location.
 
         Args:
             location: The name or address of the location.
+            node_rows (bool): If True, ways in the results keep the 'rows' of their nodes in the response's node table
+                instead of a list of coordinate tuples, and each result includes that node 'table'.
 
         The method performs the following tasks:
             - Geocodes the location using Nominatim to obtain the corresponding OpenStreetMap relation.
@@ -40,6 +43,9 @@ class osmlf:
         Note:
             The OpenStreetMap relation ID is used to retrieve detailed information about the location.
         """
+        # Whether ways are returned as rows of the node table instead of coordinate tuples
+        self.node_rows = node_rows
+
         # Geocode the location using Nominatim to obtain the OpenStreetMap relation   
         self.location = Nominatim(user_agent='osmlf').geocode(location, featuretype='relation', extratags=True)
 
@@ -60,6 +66,9 @@ class osmlf:
                 lon=float(self.location.raw['lon'])
             )
 
+            # Subarea boundaries are fetched on first use by subarea_features
+            self.__subareas = None
+
             # Set default values for different OSM key categories
             self.default_values = {
                 'amenity': [
@@ -105,6 +114,8 @@ class osmlf:
                 The dictionary has two keys: 'nodes' and 'ways'.
                 Each key maps to a dictionary where the keys are the OSM object values and the values
                 are lists of OSM object features (nodes or ways) associated with that value.
+                If node_rows is set, it also has a 'table' key with the node table of the response,
+                and way features have 'rows' into that table instead of 'coordinates'.
         """
         # Generate the Overpass query for OSM object information
         query = queries.generate_osm_query(self.osm_id, key, values)
@@ -112,14 +123,23 @@ class osmlf:
         # Execute the Overpass query and save the response
         response = self.api.query(query)
 
+        # Convert and project every node of the response once, ways refer to it by row
+        table = calculations.node_table(response.nodes, self.utm_zone)
+
         # Retrieve nodes for each value of the key and store them in a dictionary
-        nodes = {value: calculations.nodes(operations.filter_nodes(response.nodes, key, value)) for value in values}
+        nodes = {value: calculations.nodes(operations.filter_nodes(response.nodes, key, value), table) for value in values}
 
         # Retrieve ways for each value of the key and store them in a dictionary
-        ways = {value: calculations.ways(operations.filter_ways(response.ways, key, value), self.utm_zone) for value in values}
+        ways = {value: calculations.ways(operations.filter_ways(response.ways, key, value), table, self.node_rows) for value in values}
+
+        # Dictionary containing nodes and ways grouped by key values
+        objects = {'nodes': nodes, 'ways': ways}
 
-        # Return the dictionary containing nodes and ways grouped by key values
-        return {'nodes': nodes, 'ways': ways}
+        # Ways refer to the node table by row, so it is returned along with them
+        if self.node_rows:
+            objects['table'] = table
+
+        return objects
 
     def __lengths(self, key: str, values: list) -> dict:
         """
@@ -127,7 +147,7 @@ class osmlf:
 
         The method generates an Overpass query to fetch the OSM objects that match the given key and values.
         It executes the query, processes the response, and extracts the road lengths for each matching object.
-        The resulting dictionary contains the total length of roads and a list of road features, each with its tags, coordinates, and length.
+        The resulting dictionary contains the total length of roads and a list of road features, each with its ID, tags, coordinates, and length.
 
         Args:
             key (str): The key for the OSM object to retrieve (e.g., 'highway').
@@ -137,9 +157,11 @@ class osmlf:
             dict: A dictionary containing:
                 - 'total_length' (float): The total length of all roads that match the specified key and values.
                 - 'info' (list): A list of dictionaries representing road features, with the following keys:
+                    - 'way_id' (int): The OSM ID of the road feature.
                     - 'tags' (dict): Tags associated with the road feature.
                     - 'coordinates' (list): A list of coordinate tuples representing the geometry of the road feature.
                     - 'length' (float): The length of the road feature in kilometers.
+                - 'table' (dict): The node table, only if node_rows is set. Road features then have 'rows' instead of 'coordinates'.
         """
         # Generate the Overpass query for OSM object information
         query = queries.generate_osm_query(self.osm_id, key, values)
@@ -147,23 +169,38 @@ class osmlf:
         # Execute the overpass query and save the response
         response = self.api.query(query)
 
+        # Convert and project every node of the response once, ways refer to it by row
+        table = calculations.node_table(response.nodes, self.utm_zone)
+
         # Process the response to extract key information
-        length = [
-            {
-                'tags'       : way.tags,
-                'coordinates': [(float(node.lat), float(node.lon)) for node in way.nodes],
-                'length'     : calculations.total_distance(
-                    [(float(node.lat), float(node.lon)) for node in way.nodes],
-                    self.utm_zone
-                )
-            } for way in response.ways
-        ]
-
-        # Return the dictionary containing lengths of roads
-        return {
+        length = list()
+        for way in response.ways:
+
+            # Rows of the way's nodes in the node table
+            rows = calculations.way_rows(way, table)
+
+            feature = {'way_id': way.id, 'tags': way.tags}
+
+            # Store the rows of the way's nodes in the node table, or its original coordinates
+            if self.node_rows:
+                feature['rows'] = rows
+            else:
+                feature['coordinates'] = [tuple(coordinate) for coordinate in table['coordinates'][rows].tolist()]
+
+            feature['length'] = calculations.total_distance(table['projected'][rows])
+            length.append(feature)
+
+        # Dictionary containing lengths of roads
+        lengths = {
             'total_length': sum([elem['length'] for elem in length]),
             'info'        : length
         }
+
+        # Ways refer to the node table by row, so it is returned along with them
+        if self.node_rows:
+            lengths['table'] = table
+
+        return lengths
     
     def __execute(self, target: str, key: str, values):
         
@@ -326,4 +363,51 @@ class osmlf:
             dict: A dictionary containing the retrieved OSM objects, grouped by their respective values.
         """
         return self.__execute(target='objects', key='waterway', values=values)
-    
+
+    def subarea_features(self, features: dict) -> dict:
+        """
+        Assigns the nodes and ways of a category result to the administrative subareas of the location.
+
+        Args:
+            features (dict): The result of a category method (e.g. lf.amenity() or lf.highway()).
+
+        Returns:
+            dict: Per subarea aggregates keyed by subarea relation ID, each containing 'name', 'node_count',
+                'way_count', 'area' (square kilometers) and 'length' (kilometers).
+
+        Note:
+            Each node and way dictionary in features gets a 'subarea' key with its subarea relation ID, or None
+            if it is outside every subarea. The subarea boundaries are retrieved from the Overpass API once
+            and reused by later calls.
+        """
+        # Retrieve the subarea boundaries and build their spatial index on first use
+        if self.__subareas is None:
+            response = self.api.query(queries.subareas(osm_id=self.osm_id))
+            self.__subareas = calculations.subarea_polygons(response.relations)
+
+        return operations.assign_subareas(features, self.__subareas)
+
+    def snapshot(self, path: str) -> None:
+        """
+        Retrieves the administrative information and every category with its default values,
+        and writes them to a snapshot that can be reloaded without querying the Overpass API.
+        Categories without default values are skipped, except highway.
+
+        Args:
+            path (str): The base path of the snapshot. '<path>.bin' and '<path>.json' are created.
+
+        Note:
+            Use snapshots.load(path) to open the snapshot. Coordinates, areas, lengths and ids are
+            memory-mapped, so reloading is fast and the pages are shared across processes.
+        """
+        # Run every category method with its default values. Objects categories without default values (waterway)
+        # would query every object of the key only to discard it, as there is no value to group by, so they are skipped.
+        # Highway lists every road regardless of values.
+        categories = {key: getattr(self, key)() for key, values in self.default_values.items() if values or key == 'highway'}
+
+        snapshots.write(
+            path=path,
+            location=self.location.__str__(),
+            administrative=self.administrative(),
+            categories=categories
+        )
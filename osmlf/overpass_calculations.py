@@ -3,6 +3,7 @@
 # Area calculations
 import numpy as np
 from pyproj import Transformer
+import shapely
 from shapely.geometry import Polygon
 
 # Distance
@@ -11,75 +12,145 @@ from shapely.geometry import LineString, MultiLineString
 
 class calculations:
 
-    def nodes(nodes: list) -> dict:
+    def node_table(nodes: list, utm_zone: str) -> dict:
+        """
+        Converts every node of an Overpass response into a table of float coordinates, so that ways
+        sharing a node do not convert and project it again.
+
+        Args:
+            nodes (list): A list of OSM node objects, usually all nodes of an Overpass response.
+            utm_zone (str): The UTM zone to project the coordinates to.
+
+        Returns:
+            dict: A dictionary containing:
+                - 'index' (dict): Maps each node ID to its row in the table.
+                - 'coordinates' (numpy.ndarray): (latitude, longitude) of each row as float64.
+                - 'projected' (numpy.ndarray): (x, y) of each row in the UTM zone, in meters.
+        """
+
+        # Initialize a Transformer object for converting the coordinates from WGS84 to the specified UTM zone
+        transformer = Transformer.from_crs('EPSG:4326', utm_zone, always_xy=True)
+
+        # Convert the Decimal latitude and longitude of each node to float exactly once
+        coordinates = np.array([(float(node.lat), float(node.lon)) for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+        # Project all coordinates in a single call, pyproj expects (longitude, latitude) order
+        x, y = transformer.transform(coordinates[:, 1], coordinates[:, 0])
+
+        return {
+            'index'      : {node.id: row for row, node in enumerate(nodes)},
+            'coordinates': coordinates,
+            'projected'  : np.column_stack((x, y)).astype(np.float64)
+        }
+
+    def way_rows(way, table: dict) -> np.ndarray:
+        """
+        Returns the rows of a way's nodes in the node table.
+
+        Args:
+            way: An OSM way object.
+            table (dict): The node table created by calculations.node_table().
+
+        Returns:
+            numpy.ndarray: The row indices of the way's nodes, in order.
+        """
+        index = table['index']
+        return np.array([index[node.id] for node in way.nodes], dtype=np.int64)
+
+    def way_coordinates(way: dict, table: dict = None) -> np.ndarray:
+        """
+        Returns the (latitude, longitude) coordinates of a way feature as an array.
+
+        Args:
+            way (dict): A way feature, with either 'coordinates' or 'rows' into the node table.
+            table (dict): The node table of the result, required for ways with 'rows'.
+
+        Returns:
+            numpy.ndarray: The coordinates of the way's nodes, in order.
+        """
+        if 'rows' in way:
+            return table['coordinates'][way['rows']]
+
+        return np.asarray(way['coordinates'], dtype=np.float64).reshape(-1, 2)
+
+    def nodes(nodes: list, table: dict) -> dict:
         """
         Retrieves specific information from a list of OSM nodes and returns a list of dictionaries with the desired data.
 
         Args:
             nodes (list): A list of OSM node objects.
+            table (dict): The node table created by calculations.node_table().
 
         Returns:
             list: A list of dictionaries containing the desired information for each node.
         """
 
+        # Read the coordinates of the nodes from the node table
+        coordinates = table['coordinates'][[table['index'][node.id] for node in nodes]].tolist()
+
         # Create a list of dictionaries with specific information extracted from each node object
-        return [{'id': node.id, 'tags': node.tags, 'coordinate': (float(node.lat), float(node.lon))} for node in nodes]
+        return [{'id': node.id, 'tags': node.tags, 'coordinate': tuple(coordinate)} for node, coordinate in zip(nodes, coordinates)]
 
-    def ways(ways: list, utm_zone: str) -> dict:
+    def ways(ways: list, table: dict, node_rows: bool = False) -> dict:
         """
         Processes a list of OpenStreetMap (OSM) ways and extracts relevant features, including their area.
 
         Args:
             ways (list): A list of OSM way objects.
-            utm_zone (str): The UTM zone for which to compute the area.
+            table (dict): The node table created by calculations.node_table().
+            node_rows (bool): If True, each way keeps the 'rows' of its nodes in the node table instead of 'coordinates'.
 
         Returns:
             dict: A dictionary containing features of each way, total way count, and the total area.
 
         Note: 
-            The function calculates the area of each way by projecting its coordinates from the WGS84 
-            coordinate system to the specified UTM zone. It then extracts the ID, name, original coordinates, 
-            and computed area for each way. The area is provided in square kilometers.
+            The function calculates the area of each way from the projected coordinates of its nodes in the 
+            node table. It then extracts the ID, name, original coordinates, and computed area for each way. 
+            The area is provided in square kilometers.
         """
 
-        # Initialize a Transformer object for converting the coordinates from WGS84 to the specified UTM zone
-        transformer = Transformer.from_crs('EPSG:4326', utm_zone, always_xy=True)
-
         # Initialize an empty dictionary to store the features of each way
         way_features = {'ways': list()}
-        # counter = 0 # TODO: REMOVE
+
         # Process each way in the list
         for way in ways:
 
+            # Rows of the way's nodes in the node table
+            rows = calculations.way_rows(way, table)
+
+            # Original (latitude, longitude) coordinates of the way
+            coordinates = table['coordinates'][rows]
+
             # Check that the way has at least 4 nodes. This is a requirement for creating a valid polygon
             # This check helps prevent the "ValueError: A linearring requires at least 4 coordinates" 
             # That occurs when trying to create a polygon with fewer than 4 unique points
-            if len(way.nodes) > 3:
-                
-                # Extract the latitude and longitude of each node in the way to form a list of coordinates
-                coordinates = [(float(node.lat), float(node.lon)) for node in way.nodes]
+            if len(rows) > 3:
 
-                # Create another list of coordinates in (longitude, latitude) order, as required by the pyproj Transformer
-                coordinates_pyroj = [(float(node.lon), float(node.lat)) for node in way.nodes]
+                # Construct a polygon from all the projected coordinates and compute its area in square kilometers
+                polygon_projected = Polygon(table['projected'][rows])
+                area = polygon_projected.area / 10**6
 
-                # Use the Transformer to project the coordinates from geographic coordinates (longitude, latitude) to UTM coordinates
-                coordinates_projected = [transformer.transform(*coord) for coord in coordinates_pyroj]
-
-            # Construct a polygon from all the projected coordinates and compute its area in square kilometers
-            polygon_projected = Polygon(coordinates_projected)
-            area = polygon_projected.area / 10**6
+            else:
+                area = 0.0
 
             # Calculate the centroid (center of the coordinates)
-            centroid = tuple(np.mean(coordinates, axis=0))
+            centroid = tuple(coordinates.mean(axis=0).tolist())
+
+            # Store the way's ID, name and centroid
+            feature = {
+                'way_id'  : way.id,
+                'tags'    : way.tags,
+                'centroid': centroid
+            }
+
+            # Store the rows of the way's nodes in the node table, or its original coordinates
+            if node_rows:
+                feature['rows'] = rows
+            else:
+                feature['coordinates'] = [tuple(coordinate) for coordinate in coordinates.tolist()]
 
-            # Store the way's ID, name, original coordinates
-            way_features['ways'].append({
-                'way_id'     : way.id,
-                'tags'       : way.tags,
-                'centroid'   : centroid,
-                'coordinates': coordinates,
-                'area'       : area
-            })
+            feature['area'] = area
+            way_features['ways'].append(feature)
 
         # Add the total count of processed ways and the total area of all ways to the result
         way_features['way_count'] = len(way_features['ways'])
@@ -87,36 +158,21 @@ class calculations:
 
         return way_features
 
-    def total_distance(coordinates, utm_zone) -> float:
+    def total_distance(projected: np.ndarray) -> float:
         """
-        Calculates the total geodesic distance between a series of coordinates.
+        Calculates the total distance along a series of projected coordinates.
 
-        This method calculates the total distance by iterating over a list of coordinates and summing the geodesic distance
-        between consecutive points. The coordinates are assumed to be in WGS84 (latitude, longitude) format.
+        The distance is the sum of the Euclidean distances between consecutive points in the UTM zone.
 
         Args:
-            coordinates (list): A list of coordinate tuples in (latitude, longitude) format.
-            utm_zone (int): The UTM zone to convert the coordinates.
+            projected (numpy.ndarray): An array of (x, y) coordinates in meters, e.g. rows of the node table's 'projected'.
 
         Returns:
             float: The total distance in kilometers.
         """
-        # Initialize a Transformer object for converting coordinates between WGS84 and the UTM zone
-        transformer = Transformer.from_crs('EPSG:4326', utm_zone, always_xy=True)
-
-        total_distance = 0
-
-        # Iterate over the coordinates
-        for i in range(1, len(coordinates)):
-            # Convert the coordinates to the UTM zone
-            coord1 = transformer.transform(coordinates[i-1][1], coordinates[i-1][0])
-            coord2 = transformer.transform(coordinates[i][1], coordinates[i][0])
 
-            # Calculate the Euclidean distance between consecutive points
-            distance = ((coord2[0] - coord1[0])**2 + (coord2[1] - coord1[1])**2)**(1/2) / 1000
-            total_distance += distance
-
-        return total_distance
+        # Calculate the Euclidean distance between consecutive points and sum them
+        return float(np.hypot(*np.diff(projected, axis=0).T).sum()) / 1000
     
     def area_of_members(members: list, utm_zone: str) -> dict:
         """
@@ -149,4 +205,41 @@ class calculations:
 
         # Compute the area of the created polygon and convert it to square kilometers (since the original area is in square meters)
         # Return the computed area
-        return polygon_projected.area / 10**6
\ No newline at end of file
+        return polygon_projected.area / 10**6
+
+    def subarea_polygons(relations: list) -> dict:
+        """
+        Assembles the boundary of each subarea relation from its member geometries and builds a spatial index over them.
+
+        Args:
+            relations (list): A list of OSM relation objects. Each member should have 'geometry' which should contain 'lon' and 'lat'.
+
+        Returns:
+            dict: A dictionary containing:
+                - 'ids' (numpy.ndarray): The relation ID of each subarea.
+                - 'names' (list): The name of each subarea, or None if it has no name.
+                - 'polygons' (numpy.ndarray): The boundary of each subarea as a (multi)polygon in (longitude, latitude).
+                - 'tree' (shapely.STRtree): A spatial index over the polygons.
+
+        Note:
+            Outer and inner rings may be split over several ways, so the members of each role are polygonized
+            together and the inner polygons are subtracted from the outer ones.
+        """
+
+        def rings(relation, role):
+            # Build a line for each member of the given role, members outside the response have no geometry
+            lines = [
+                shapely.linestrings([(float(geometry.lon), float(geometry.lat)) for geometry in member.geometry])
+                for member in relation.members
+                if member.role == role and getattr(member, 'geometry', None) and len(member.geometry) > 1
+            ]
+            return shapely.union_all(shapely.get_parts(shapely.polygonize(lines)))
+
+        polygons = [shapely.difference(rings(relation, 'outer'), rings(relation, 'inner')) for relation in relations]
+
+        return {
+            'ids'     : np.array([relation.id for relation in relations], dtype=np.int64),
+            'names'   : [relation.tags.get('name') for relation in relations],
+            'polygons': np.array(polygons, dtype=object),
+            'tree'    : shapely.STRtree(polygons)
+        }
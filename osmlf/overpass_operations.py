@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import requests
+import numpy as np
+import shapely
 import xml.etree.ElementTree as et
 
 from .overpass_calculations import calculations
@@ -146,3 +148,78 @@ class operations:
 
         # # Get all areas from outers
         return calculations.area_of_members(members=outers, utm_zone=utm_zone)
+
+    def assign_subareas(features: dict, subareas: dict) -> dict:
+        """
+        Tags every node and way of a category result with the subarea it is located in and aggregates them per subarea.
+
+        Args:
+            features (dict): The result of a category method (e.g. osmlf.amenity() or osmlf.highway()).
+            subareas (dict): The subarea boundaries created by calculations.subarea_polygons().
+
+        Returns:
+            dict: A dictionary keyed by subarea relation ID, each containing:
+                - 'name' (str): The name of the subarea.
+                - 'node_count' (int): The number of nodes in the subarea.
+                - 'way_count' (int): The number of ways in the subarea.
+                - 'area' (float): The total area of the ways in the subarea in square kilometers.
+                - 'length' (float): The total length of the ways in the subarea in kilometers.
+
+        Note:
+            Nodes are located by their coordinate and ways by their centroid (the mean of their coordinates 
+            for highway results). Each node and way dictionary gets a 'subarea' key with the relation ID, 
+            or None if it is outside every subarea. All points are tested against the spatial index in a 
+            single vectorized query.
+        """
+
+        # Collect the node and way dictionaries of the result
+        if 'info' in features:
+            nodes = []
+            ways = features['info']
+            centroids = [tuple(calculations.way_coordinates(way, features.get('table')).mean(axis=0)) for way in ways]
+        else:
+            nodes = [node for value in features['nodes'].values() for node in value]
+            ways = [way for value in features['ways'].values() for way in value['ways']]
+            centroids = [way['centroid'] for way in ways]
+
+        # (latitude, longitude) of every node followed by every way centroid
+        coordinates = np.array([node['coordinate'] for node in nodes] + centroids, dtype=np.float64).reshape(-1, 2)
+
+        # Find the subarea of every point at once, a point on a shared border keeps the first match
+        points = shapely.points(coordinates[:, 1], coordinates[:, 0])
+        point_index, subarea_index = subareas['tree'].query(points, predicate='intersects')
+        assigned, first = np.unique(point_index, return_index=True)
+        assignment = np.full(len(points), -1, dtype=np.int64)
+        assignment[assigned] = subarea_index[first]
+
+        # Tag each node and way with its subarea relation ID
+        ids = subareas['ids'].tolist()
+        for feature, index in zip(nodes + ways, assignment.tolist()):
+            feature['subarea'] = ids[index] if index >= 0 else None
+
+        # Split the assignment into nodes and ways, leaving out the ones outside every subarea
+        node_assignment = assignment[:len(nodes)]
+        node_assignment = node_assignment[node_assignment >= 0]
+        way_assignment = assignment[len(nodes):]
+        inside = way_assignment >= 0
+        way_assignment = way_assignment[inside]
+
+        # Areas are only available for object ways and lengths for highway ways
+        areas = np.array([way.get('area', 0.0) for way in ways], dtype=np.float64)[inside]
+        lengths = np.array([way.get('length', 0.0) for way in ways], dtype=np.float64)[inside]
+
+        # Aggregate the assigned features per subarea
+        node_counts = np.bincount(node_assignment, minlength=len(ids)).tolist()
+        way_counts = np.bincount(way_assignment, minlength=len(ids)).tolist()
+        total_areas = np.bincount(way_assignment, weights=areas, minlength=len(ids)).astype(np.float64).tolist()
+        total_lengths = np.bincount(way_assignment, weights=lengths, minlength=len(ids)).astype(np.float64).tolist()
+
+        return {
+            subarea_id: {
+                'name'      : subareas['names'][i],
+                'node_count': node_counts[i],
+                'way_count' : way_counts[i],
+                'area'      : total_areas[i],
+                'length'    : total_lengths[i]
+            } for i, subarea_id in enumerate(ids)
+        }
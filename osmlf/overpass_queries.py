@@ -15,6 +15,19 @@ class queries:
         out geom;
         """
     
+    def subareas(osm_id: int) -> str:
+        """Given osm_id's subarea relation objects
+        
+        Returns:
+            str: Query that gives the subarea relations of osm id's relation object with their member geometries
+        """
+        return f"""
+        [out:json];
+        rel({osm_id});
+        rel(r:"subarea");
+        out geom;
+        """
+    
     def generate_osm_query(osm_id: int, key: str, values: list) -> str:
         """
         Given an OpenStreetMap ID, a key, and a list of values, generate an Overpass QL query that retrieves 
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import uuid
+import numpy as np
+
+from .overpass_calculations import calculations
+
+# Every array in the binary file starts on a multiple of this many bytes
+ALIGNMENT = 64
+
+# The binary file starts with this marker followed by the generation id of the snapshot
+MAGIC = b'osmlf-snapshot\0\0'
+
+# Layout version of the snapshot files, increased whenever the layout changes
+VERSION = 2
+
+class snapshots:
+
+    def write(path: str, location: str, administrative: dict, categories: dict) -> None:
+        """
+        Writes the full result set of a location to a binary file and a JSON sidecar.
+
+        Args:
+            path (str): The base path of the snapshot. '<path>.bin' and '<path>.json' are created.
+            location (str): The display name of the location.
+            administrative (dict): The result of osmlf.administrative().
+            categories (dict): Results of the category methods, keyed by OSM key (e.g. 'amenity').
+                Results with node rows (osmlf(..., node_rows=True)) are read through their node table.
+
+        Note:
+            Ids, coordinates, centroids, areas and lengths are stored as fixed-layout arrays in '<path>.bin',
+            which is memory-mapped on load. Tags are stored there too, as compact JSON encoded rows with an
+            offsets array, so they are only decoded when requested. Totals, administrative information and
+            the row range of every category value go in '<path>.json'.
+
+            Both files are written to temporary names and then replaced, the binary file first, so processes
+            that still map an older snapshot keep reading it. Both files carry the same generation id, so a
+            binary file and sidecar from different writes are rejected on load.
+        """
+
+        # Row based storage for nodes
+        node_ids, node_coordinates, node_tags = [], [], []
+
+        # Row based storage for ways, coordinates of every way are concatenated and indexed by way_offsets
+        way_ids, way_centroids, way_areas, way_lengths, way_tags = [], [], [], [], []
+        way_offsets, way_coordinates = [0], []
+
+        def add_way(way_id, tags, centroid, coordinates, area, length):
+            way_ids.append(way_id)
+            way_tags.append(tags)
+            way_centroids.append(centroid)
+            way_areas.append(area)
+            way_lengths.append(length)
+            way_coordinates.append(coordinates)
+            way_offsets.append(way_offsets[-1] + len(coordinates))
+
+        # The row range of every category value in the node and way arrays
+        layout = dict()
+
+        for key, result in categories.items():
+
+            # The node table of the result, only present with node rows
+            table = result.get('table')
+
+            # Lengths (highway) results only have a flat list of ways
+            if 'info' in result:
+                start = len(way_ids)
+                for way in result['info']:
+                    add_way(way['way_id'], way['tags'], (np.nan, np.nan), calculations.way_coordinates(way, table), np.nan, way['length'])
+
+                layout[key] = {
+                    'target'      : 'lengths',
+                    'ways'        : [start, len(way_ids)],
+                    'total_length': result['total_length']
+                }
+
+            # Objects results are grouped by value, both for nodes and ways
+            else:
+                layout[key] = {'target': 'objects', 'nodes': dict(), 'ways': dict(), 'total_area': dict()}
+
+                for value, nodes in result['nodes'].items():
+                    start = len(node_ids)
+                    for node in nodes:
+                        node_ids.append(node['id'])
+                        node_tags.append(node['tags'])
+                        node_coordinates.append(node['coordinate'])
+                    layout[key]['nodes'][value] = [start, len(node_ids)]
+
+                for value, ways in result['ways'].items():
+                    start = len(way_ids)
+                    for way in ways['ways']:
+                        add_way(way['way_id'], way['tags'], way['centroid'], calculations.way_coordinates(way, table), way['area'], np.nan)
+                    layout[key]['ways'][value] = [start, len(way_ids)]
+                    layout[key]['total_area'][value] = ways['total_area']
+
+        def encode(tags):
+            # Encode each row as compact JSON followed by a comma, so a range of rows decodes with a single json.loads
+            rows = [json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b',' for row in tags]
+            offsets = np.cumsum([0] + [len(row) for row in rows], dtype=np.int64)
+            return np.frombuffer(b''.join(rows), dtype=np.uint8), offsets
+
+        node_tag_blob, node_tag_offsets = encode(node_tags)
+        way_tag_blob, way_tag_offsets = encode(way_tags)
+
+        arrays = {
+            'node_ids'        : np.asarray(node_ids, dtype=np.int64),
+            'node_coordinates': np.asarray(node_coordinates, dtype=np.float64).reshape(-1, 2),
+            'way_ids'         : np.asarray(way_ids, dtype=np.int64),
+            'way_centroids'   : np.asarray(way_centroids, dtype=np.float64).reshape(-1, 2),
+            'way_areas'       : np.asarray(way_areas, dtype=np.float64),
+            'way_lengths'     : np.asarray(way_lengths, dtype=np.float64),
+            'way_offsets'     : np.asarray(way_offsets, dtype=np.int64),
+            'way_coordinates' : np.concatenate(way_coordinates) if way_coordinates else np.empty((0, 2), dtype=np.float64),
+            'node_tags'       : node_tag_blob,
+            'node_tag_offsets': node_tag_offsets,
+            'way_tags'        : way_tag_blob,
+            'way_tag_offsets' : way_tag_offsets
+        }
+
+        # Every write gets a new generation id, shared by the binary file and the sidecar
+        generation = uuid.uuid4().hex
+
+        # Write to temporary files next to the targets, so they can be replaced atomically
+        temporary = {extension: f'{path}.{extension}.{os.getpid()}.tmp' for extension in ('bin', 'json')}
+
+        try:
+            snapshots.__write_files(temporary, generation, arrays, location, administrative, layout)
+
+            # Replace the binary file first, a reader pairing it with the old sidecar fails the generation check
+            os.replace(temporary['bin'], f'{path}.bin')
+            os.replace(temporary['json'], f'{path}.json')
+
+        finally:
+            for name in temporary.values():
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def __write_files(paths: dict, generation: str, arrays: dict, location: str, administrative: dict, layout: dict) -> None:
+        """
+        Writes the binary file and the sidecar of a snapshot to the given paths.
+
+        Args:
+            paths (dict): The paths of the binary file ('bin') and the sidecar ('json').
+            generation (str): The generation id of the snapshot.
+            arrays (dict): The arrays to store in the binary file, keyed by name.
+            location (str): The display name of the location.
+            administrative (dict): The result of osmlf.administrative().
+            layout (dict): The row range of every category value.
+        """
+
+        # Write the header and the arrays back to back, each one aligned so it can be viewed in place after mapping
+        array_layout = dict()
+        with open(paths['bin'], 'wb') as fh:
+            fh.write(MAGIC + generation.encode('ascii'))
+            for name, array in arrays.items():
+                offset = -fh.tell() % ALIGNMENT
+                fh.write(b'\0' * offset)
+                array_layout[name] = {'offset': fh.tell(), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+                fh.write(np.ascontiguousarray(array).tobytes())
+
+        sidecar = {
+            'version'       : VERSION,
+            'generation'    : generation,
+            'location'      : location,
+            'administrative': administrative,
+            'arrays'        : array_layout,
+            'categories'    : layout
+        }
+
+        with open(paths['json'], 'w', encoding='utf-8') as fh:
+            json.dump(sidecar, fh, ensure_ascii=False, separators=(',', ':'))
+
+    def load(path: str) -> 'snapshot':
+        """
+        Opens a snapshot written by snapshots.write().
+
+        Args:
+            path (str): The base path of the snapshot, without the '.bin' or '.json' extension.
+
+        Returns:
+            snapshot: A snapshot object backed by a read-only memory map of '<path>.bin'.
+        """
+        return snapshot(path)
+
+class snapshot:
+
+    def __init__(self, path: str):
+        """
+        Opens the snapshot at the given base path.
+
+        Args:
+            path (str): The base path of the snapshot, without the '.bin' or '.json' extension.
+
+        Note:
+            The binary file is mapped read-only, so every array is a zero-copy view and processes
+            loading the same snapshot share its pages. Tags are decoded only for the rows that are requested.
+
+        Raises:
+            ValueError: If the snapshot has an unknown version, if the binary file and the sidecar come from
+                different writes, or if an array does not fit inside the binary file.
+        """
+        with open(f'{path}.json', encoding='utf-8') as fh:
+            sidecar = json.load(fh)
+
+        # Older or newer layouts would be read with the wrong offsets and dtypes
+        if sidecar.get('version') != VERSION:
+            raise ValueError(f"Snapshot '{path}' has version {sidecar.get('version')}, only version {VERSION} is supported")
+
+        self.location = sidecar['location']
+        self.categories = sidecar['categories']
+        self.__administrative = sidecar['administrative']
+
+        buffer = np.memmap(f'{path}.bin', dtype=np.uint8, mode='r')
+
+        # The binary file must come from the same write as the sidecar
+        header = buffer[:len(MAGIC) + len(sidecar['generation'])].tobytes()
+        if header != MAGIC + sidecar['generation'].encode('ascii'):
+            raise ValueError(f"Snapshot '{path}.bin' does not belong to '{path}.json', it was rewritten while loading")
+
+        # Create a view for every array directly on the mapped buffer
+        self.arrays = dict()
+        for name, spec in sidecar['arrays'].items():
+            shape = tuple(spec['shape'])
+            dtype = np.dtype(spec['dtype'])
+
+            # Never view bytes outside the mapped file
+            if spec['offset'] < 0 or spec['offset'] + int(np.prod(shape)) * dtype.itemsize > buffer.size:
+                raise ValueError(f"Snapshot '{path}.bin' is too small for array '{name}'")
+
+            if 0 in shape:
+                self.arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=spec['offset'])
+
+    def __str__(self) -> str:
+        return self.location
+
+    def __repr__(self) -> str:
+        return f'snapshot({self.location})'
+
+    def __tags(self, kind: str, start: int, stop: int) -> list:
+        """
+        Decodes the tags of the given rows from the encoded tags in the binary file.
+
+        Args:
+            kind (str): Either 'node' or 'way'.
+            start (int): The first row.
+            stop (int): The row after the last one.
+
+        Returns:
+            list: The tag dictionary of each row.
+        """
+        if start == stop:
+            return []
+
+        offsets = self.arrays[f'{kind}_tag_offsets']
+
+        # Drop the trailing comma of the last row and decode all rows as one JSON array
+        return json.loads(b'[' + self.arrays[f'{kind}_tags'][offsets[start]:offsets[stop] - 1].tobytes() + b']')
+
+    def administrative(self) -> dict:
+        """
+        Returns the administrative information stored in the snapshot, in the form of osmlf.administrative().
+        """
+        return {**self.__administrative, 'core': tuple(self.__administrative['core'])}
+
+    def nodes(self, key: str, value: str) -> dict:
+        """
+        Returns the nodes of a category value as array views.
+
+        Args:
+            key (str): The OSM key (e.g. 'amenity').
+            value (str): The OSM value (e.g. 'cafe').
+
+        Returns:
+            dict: A dictionary with 'ids', 'coordinates' (latitude, longitude) and 'tags' of the nodes.
+        """
+        start, stop = self.categories[key]['nodes'][value]
+
+        return {
+            'ids'        : self.arrays['node_ids'][start:stop],
+            'coordinates': self.arrays['node_coordinates'][start:stop],
+            'tags'       : self.__tags('node', start, stop)
+        }
+
+    def ways(self, key: str, value: str = None) -> dict:
+        """
+        Returns the ways of a category value as array views.
+
+        Args:
+            key (str): The OSM key (e.g. 'landuse').
+            value (str): The OSM value (e.g. 'forest'). Not used for lengths categories (e.g. 'highway').
+
+        Returns:
+            dict: A dictionary with 'ids', 'centroids', 'areas', 'lengths', 'tags', 'coordinates' of the ways,
+                and 'offsets' such that coordinates[offsets[i]:offsets[i + 1]] belongs to the i-th way.
+
+        Note:
+            Centroids and areas are not available for lengths categories and are stored as NaN.
+            Lengths are NaN for objects categories.
+        """
+        category = self.categories[key]
+        start, stop = category['ways'] if category['target'] == 'lengths' else category['ways'][value]
+
+        offsets = self.arrays['way_offsets'][start:stop + 1]
+
+        return {
+            'ids'        : self.arrays['way_ids'][start:stop],
+            'centroids'  : self.arrays['way_centroids'][start:stop],
+            'areas'      : self.arrays['way_areas'][start:stop],
+            'lengths'    : self.arrays['way_lengths'][start:stop],
+            'coordinates': self.arrays['way_coordinates'][offsets[0]:offsets[-1]],
+            'offsets'    : offsets - offsets[0],
+            'tags'       : self.__tags('way', start, stop)
+        }
+
+    def result(self, key: str) -> dict:
+        """
+        Rebuilds the result of a category method from the snapshot.
+        Ways always have 'coordinates', also when the snapshot was written from node rows.
+
+        Args:
+            key (str): The OSM key (e.g. 'amenity').
+
+        Returns:
+            dict: The same dictionary the category method (e.g. osmlf.amenity()) returned when the snapshot was written.
+
+        Note:
+            This converts the arrays back into dictionaries of tuples. Prefer nodes() and ways() for large locations.
+        """
+        category = self.categories[key]
+
+        def coordinates(ways, i):
+            return [tuple(coord) for coord in ways['coordinates'][ways['offsets'][i]:ways['offsets'][i + 1]].tolist()]
+
+        if category['target'] == 'lengths':
+            ways = self.ways(key)
+            return {
+                'total_length': category['total_length'],
+                'info'        : [
+                    {
+                        'way_id'     : int(ways['ids'][i]),
+                        'tags'       : ways['tags'][i],
+                        'coordinates': coordinates(ways, i),
+                        'length'     : float(ways['lengths'][i])
+                    } for i in range(len(ways['tags']))
+                ]
+            }
+
+        nodes = dict()
+        for value in category['nodes']:
+            selected = self.nodes(key, value)
+            nodes[value] = [
+                {'id': node_id, 'tags': tags, 'coordinate': tuple(coordinate)}
+                for node_id, tags, coordinate in zip(selected['ids'].tolist(), selected['tags'], selected['coordinates'].tolist())
+            ]
+
+        ways = dict()
+        for value in category['ways']:
+            selected = self.ways(key, value)
+            ways[value] = {
+                'ways': [
+                    {
+                        'way_id'     : int(selected['ids'][i]),
+                        'tags'       : selected['tags'][i],
+                        'centroid'   : tuple(selected['centroids'][i].tolist()),
+                        'coordinates': coordinates(selected, i),
+                        'area'       : float(selected['areas'][i])
+                    } for i in range(len(selected['tags']))
+                ],
+                'way_count' : len(selected['tags']),
+                'total_area': category['total_area'][value]
+            }
+
+        return {'nodes': nodes, 'ways': ways}